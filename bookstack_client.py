@@ -1,6 +1,70 @@
+import json
 import requests
-from typing import Dict, Tuple
-from utils import logger
+from typing import Dict, Iterator, List, Tuple
+from urllib.parse import quote
+from utils import B64_CHUNK_SIZE, DeferredDataUrl, logger
+
+
+class StreamingJSONBody:
+    """JSON request body whose deferred embeds are base64-encoded while it is sent"""
+
+    def __init__(self, data: Dict, embeds: Dict[str, DeferredDataUrl]):
+        text = json.dumps(data)
+        self.parts = []
+        position = 0
+        for match in DeferredDataUrl.PLACEHOLDER_PATTERN.finditer(text):
+            embed = embeds.get(match.group())
+            if embed is None:
+                continue
+            self.parts.append(text[position:match.start()].encode("utf-8"))
+            self.parts.append(embed)
+            position = match.end()
+        self.parts.append(text[position:].encode("utf-8"))
+        self.seek(0)
+
+    def __len__(self) -> int:
+        return sum(len(part) for part in self.parts)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for part in self.parts:
+            if isinstance(part, DeferredDataUrl):
+                yield from part.iter_chunks()
+            elif part:
+                yield part
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        """Restarts the stream, requests rewinds the body this way when following redirects"""
+        if whence != 0:
+            raise OSError("StreamingJSONBody only supports absolute seeks")
+        self._chunks = None
+        self._current = b""
+        self._offset = 0
+        self._position = 0
+        while self._position < offset and self.read(min(offset - self._position, B64_CHUNK_SIZE)):
+            pass
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if self._chunks is None:
+            self._chunks = iter(self)
+        parts = []
+        while size != 0:
+            if self._offset >= len(self._current):
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._current, self._offset = chunk, 0
+            end = len(self._current) if size < 0 else min(len(self._current), self._offset + size)
+            parts.append(self._current[self._offset:end])
+            if size > 0:
+                size -= end - self._offset
+            self._offset = end
+        data = b"".join(parts)
+        self._position += len(data)
+        return data
 
 
 class BookStackClient:
@@ -30,11 +94,15 @@ class BookStackClient:
         except Exception as e:
             logger.error(f"Unexpected error while testing endpoints: {e}")
 
-    def request(self, method: str, endpoint: str, data: Dict = None, files: Dict = None) -> Tuple[bool, Dict]:
+    def request(self, method: str, endpoint: str, data: Dict = None, files: Dict = None,
+                embeds: Dict[str, DeferredDataUrl] = None) -> Tuple[bool, Dict]:
         url = f"{self.config.BOOKSTACK_URL}{endpoint}"
 
         try:
-            if method.upper() == "GET":
+            if embeds and method.upper() in ("POST", "PUT"):
+                headers = {**self.headers, "Content-Type": "application/json"}
+                response = requests.request(method.upper(), url, headers=headers, data=StreamingJSONBody(data, embeds))
+            elif method.upper() == "GET":
                 response = requests.get(url, headers=self.headers)
             elif method.upper() == "POST":
                 if files:
@@ -61,6 +129,36 @@ class BookStackClient:
         except Exception as e:
             return False, {"error": str(e)}
 
+    def list_all(self, endpoint: str, count: int = 500) -> Tuple[bool, List[Dict]]:
+        """Fetches every item of a paginated list endpoint"""
+        items = []
+        offset = 0
+        while True:
+            success, response = self.request("GET", f"{endpoint}?count={count}&offset={offset}&sort=+id")
+            if not success:
+                logger.error(f"Failed to list {endpoint}: {response}")
+                return False, items
+            data = response.get("data", [])
+            items.extend(data)
+            offset += len(data)
+            if not data or offset >= response.get("total", 0):
+                return True, items
+
+    def search_all(self, query: str, count: int = 100) -> Tuple[bool, List[Dict]]:
+        """Fetches every result of a search query"""
+        items = []
+        page = 1
+        while True:
+            success, response = self.request("GET", f"/search?query={quote(query)}&count={count}&page={page}")
+            if not success:
+                logger.error(f"Failed to search '{query}': {response}")
+                return False, items
+            data = response.get("data", [])
+            items.extend(data)
+            page += 1
+            if not data or len(items) >= response.get("total", 0):
+                return True, items
+
     def clear_content(self) -> Dict[str, int]:
         logger.info("Clearing existing BookStack content")
         deleted_objects = {"shelf": 0, "book": 0}
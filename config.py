@@ -17,11 +17,18 @@ class Config(BaseModel):
             "BOOKSTACK_URL": args.bookstack_url,
             "BOOKSTACK_ID": args.bookstack_id,
             "BOOKSTACK_SECRET": args.bookstack_secret,
+            "OPTIMIZE_IMAGES": "true" if args.optimize_images else None,
+            "IMAGE_MAX_DIMENSION": args.image_max_dimension,
+            "RUN_MANIFEST": args.manifest,
         }
         config_data.update({k: v for k, v in cli_overrides.items() if v is not None})
 
         return cls(**config_data)
 
+    def is_enabled(self, key: str) -> bool:
+        value = getattr(self, key, None)
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
+
 
 def parser_setup():
     parser = argparse.ArgumentParser(description="Confluence to BookStack migration tool")
@@ -30,5 +37,10 @@ def parser_setup():
     parser.add_argument("-id", "--bookstack-id", help="BookStack API ID")
     parser.add_argument("-secret", "--bookstack-secret", help="BookStack API Secret")
     parser.add_argument("-c", "--clear", action="store_true", help="Clear existing BookStack content before migration")
+    parser.add_argument("-oi", "--optimize-images", action="store_true", help="Downscale and recompress images before embedding them")
+    parser.add_argument("--image-max-dimension", type=int, help="Maximum width or height of optimized images, in pixels")
+    parser.add_argument("-v", "--verify", action="store_true", help="Verify migrated BookStack content against the run manifest")
+    parser.add_argument("-r", "--repair", action="store_true", help="Apply repairs for the discrepancies found by --verify")
+    parser.add_argument("-m", "--manifest", help="Path to the run manifest (default: migration_manifest.json)")
     args = parser.parse_args()
     return args
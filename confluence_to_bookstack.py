@@ -1,10 +1,12 @@
 from functools import lru_cache
 import os
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from bs4 import BeautifulSoup, MarkupResemblesLocatorWarning
 from utils import logger, DepthLevel
 from content_processor import ContentProcessor
 from bookstack_client import BookStackClient
+from image_optimizer import ImageOptimizer
+from migration_verifier import MigrationVerifier, content_hash, load_manifest, save_manifest
 import warnings
 
 warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning)
@@ -14,7 +16,8 @@ class ConfluenceToBookstack:
     def __init__(self, config):
         self.config = config
         self.api_client = BookStackClient(config)
-        self.content_processor = ContentProcessor(config, self.api_client)
+        self.image_optimizer = ImageOptimizer(config) if config.is_enabled("OPTIMIZE_IMAGES") else None
+        self.content_processor = ContentProcessor(config, self.api_client, self.image_optimizer)
         
         self.created_objects = {
             "shelves": {},
@@ -22,6 +25,7 @@ class ConfluenceToBookstack:
             "chapters": {},
             "pages": {},
         }
+        self.page_states = {}
         self.deleted_objects = {
             "shelf": 0,
             "book": 0,
@@ -50,26 +54,142 @@ class ConfluenceToBookstack:
             "title": item["title"],
             "id": book_id,
             "shelf_id": shelf_id,
+            "href": item["href"],
         }
 
-    def _add_chapter(self, item: Dict, chapter_id):
+    def _add_chapter(self, item: Dict, book_id, chapter_id):
         self.created_objects["chapters"][chapter_id] = {
             "title": item["title"],
             "id": chapter_id,
+            "book_id": book_id,
+            "href": item["href"],
         }
 
-    def _add_page(self, item: Dict, page_id):
+    def _add_page(self, item: Dict, page_id, book_id=None, chapter_id=None):
         self.created_objects["pages"][page_id] = {
             "title": item["title"],
             "id": page_id,
+            "book_id": book_id,
+            "chapter_id": chapter_id,
+            "href": item["href"],
+            **self.page_states.get(page_id, {}),
         }
 
     def run(self):
         self.api_client.test_endpoints()
-        self.find_index_files()
-        self.link_books_to_shelves()
+        if self.image_optimizer:
+            self.image_optimizer.optimize_tree(self.config.SOURCE_PATH)
+        try:
+            self.find_index_files()
+            self.link_books_to_shelves()
+        finally:
+            # Interrupted runs are recorded too, so they can be verified and repaired
+            save_manifest(self.manifest_path, self.build_manifest())
         self.print_report()
-        
+
+    @property
+    def manifest_path(self) -> str:
+        return getattr(self.config, "RUN_MANIFEST", None) or "migration_manifest.json"
+
+    def build_manifest(self) -> Dict:
+        """Snapshot of the created objects, used to verify the migration afterwards"""
+        manifest = {
+            kind: {str(item_id): entry for item_id, entry in objects.items() if item_id is not None}
+            for kind, objects in self.created_objects.items()
+        }
+        manifest["attachments"] = self.build_attachments_manifest()
+        return manifest
+
+    def build_attachments_manifest(self) -> Dict:
+        return {
+            str(attachment["id"]): {
+                "title": attachment["name"],
+                "id": attachment["id"],
+                "page_id": int(page_id),
+                "file_path": file_path,
+            }
+            for page_id, attachments in self.content_processor.uploaded_attachments.items()
+            for file_path, attachment in attachments.items()
+            if attachment["id"] is not None
+        }
+
+    def load_attachments(self, manifest: Dict):
+        """Restores the uploaded attachments of a previous run so they are not uploaded twice"""
+        for entry in manifest.get("attachments", {}).values():
+            self.content_processor.mark_attachment_uploaded(
+                str(entry["page_id"]), entry["file_path"], entry["id"], entry["title"]
+            )
+
+    def verify(self, repair: bool = False):
+        """Diffs BookStack content against the stored run manifest"""
+        manifest = load_manifest(self.manifest_path)
+        if manifest is None:
+            return
+        verifier = MigrationVerifier(self.api_client, manifest)
+        verifier.verify()
+        verifier.print_report()
+        if repair and verifier.repairs:
+            self.apply_repairs(verifier.repairs, manifest)
+            save_manifest(self.manifest_path, manifest)
+
+    def apply_repairs(self, repairs: List[Dict], manifest: Dict):
+        """Sends the queued repair requests and keeps the manifest in sync"""
+        self.load_attachments(manifest)
+        content_actions = ("update_content", "recreate")
+        if self.image_optimizer and any(repair["action"] in content_actions for repair in repairs):
+            self.image_optimizer.optimize_tree(self.config.SOURCE_PATH)
+        repaired = 0
+        for repair in repairs:
+            kind, item_id, entry = repair["kind"], repair["id"], repair["data"]
+            # Pages outside a chapter are only sent their book_id, as in process_item
+            parents = {
+                field: entry.get(field) for field in ("book_id", "chapter_id")
+                if entry.get(field) is not None
+            }
+            match repair["action"]:
+                case "delete":
+                    success, response = self.api_client.request("DELETE", f"/{kind}/{item_id}")
+                case "move":
+                    success, response = self.api_client.request("PUT", f"/{kind}/{item_id}", entry)
+                case "update_content":
+                    payload, _ = self.generate_payload(entry, DepthLevel.PAGE, parents, str(item_id))
+                    success, response = self.api_client.request(
+                        "PUT", f"/pages/{item_id}", payload, embeds=self.content_processor.pop_embeds()
+                    )
+                    if success:
+                        manifest[kind][str(item_id)].update({
+                            "content_hash": content_hash(response.get("html")),
+                            "updated_at": response.get("updated_at"),
+                        })
+                case "recreate":
+                    # Attachments of the old page go with it, the new page gets its own uploads
+                    self.content_processor.uploaded_attachments.pop(str(item_id), None)
+                    manifest["attachments"] = {
+                        attachment_id: attachment
+                        for attachment_id, attachment in manifest.get("attachments", {}).items()
+                        if attachment["page_id"] != item_id
+                    }
+                    page_id = self.add_item(DepthLevel.PAGE, "/pages", entry, parents)
+                    success, response = page_id is not None, {}
+                    if success:
+                        manifest[kind].pop(str(item_id), None)
+                        manifest[kind][str(page_id)] = {
+                            **entry,
+                            "id": page_id,
+                            **self.page_states.get(page_id, {}),
+                        }
+                case _:
+                    success, response = False, {"error": f"Unknown repair action: {repair['action']}"}
+
+            if success:
+                logger.info(f"Repaired {kind[:-1]} {item_id} ({repair['reason']})")
+                repaired += 1
+            else:
+                logger.error(f"Failed to repair {kind[:-1]} {item_id} ({repair['reason']}): {response}")
+                self.errors += 1
+
+        manifest.setdefault("attachments", {}).update(self.build_attachments_manifest())
+        logger.info(f"Repairs applied: {repaired}/{len(repairs)}")
 
     def link_books_to_shelves(self):
         for shelf in self.created_objects["shelves"].values():
@@ -186,6 +306,8 @@ class ConfluenceToBookstack:
             logger.info(f"Books created: {len(self.created_objects['books'])}")
             logger.info(f"Chapters created: {len(self.created_objects['chapters'])}")
             logger.info(f"Pages created: {len(self.created_objects['pages'])}")
+            if self.image_optimizer:
+                self.image_optimizer.print_report()
 
         logger.info(f"Errors encountered while processing: {len(self.content_processor.errors)}")
         logger.info(f"Total errors encountered: {self.errors + len(self.content_processor.errors)}")
@@ -201,21 +323,22 @@ class ConfluenceToBookstack:
                 book_id = self.add_item(DepthLevel.BOOK, "/books", item)
                 page_id = self.add_item(DepthLevel.PAGE, "/pages", item, {"book_id": book_id})
                 self._add_book(item, shelf_id, book_id)
-                self._add_page(item, page_id)
+                self._add_page(item, page_id, book_id)
 
             case DepthLevel.CHAPTER:
                 if item.get("children") == []:
                     # relevant to create chapter then page ?
                     page_id = self.add_item(DepthLevel.PAGE, "/pages", item, {"book_id": book_id})
+                    self._add_page(item, page_id, book_id)
                 else:
                     chapter_id = self.add_item(DepthLevel.CHAPTER, "/chapters", item, {"book_id": book_id})
                     page_id = self.add_item(DepthLevel.PAGE, "/pages", item, {"book_id": book_id, "chapter_id": chapter_id})
-                    self._add_chapter(item, chapter_id)
-                self._add_page(item, page_id)
+                    self._add_chapter(item, book_id, chapter_id)
+                    self._add_page(item, page_id, book_id, chapter_id)
                     
             case DepthLevel.PAGE:
                 page_id = self.add_item(DepthLevel.PAGE, "/pages", item, {"book_id": book_id, "chapter_id": chapter_id})
-                self._add_page(item, page_id)
+                self._add_page(item, page_id, book_id, chapter_id)
 
             case _:
                 logger.warning(f"Unknown type for item: {item['title']}")
@@ -237,8 +360,14 @@ class ConfluenceToBookstack:
         if type == DepthLevel.PAGE:
             try:
                 updated_payload, title = self.generate_payload(item, type, additional_data, str(item_id))
-                success, response = self.api_client.request("PUT", f"/pages/{item_id}", updated_payload)
+                success, response = self.api_client.request(
+                    "PUT", f"/pages/{item_id}", updated_payload, embeds=self.content_processor.pop_embeds()
+                )
                 if success:
+                    self.page_states[item_id] = {
+                        "content_hash": content_hash(response.get("html")),
+                        "updated_at": response.get("updated_at"),
+                    }
                     logger.info(f"Page '{title}' updated with processed attachments")
                 else:
                     logger.warning(f"Page '{title}' created but failed to update with attachments")
@@ -1,28 +1,34 @@
 import os
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 from bs4 import BeautifulSoup, Tag
-from utils import image_to_data_url, is_image_file, logger, DepthLevel, title_to_slug
+from utils import DeferredDataUrl, is_image_file, logger, DepthLevel, title_to_slug
 
 
 class ContentProcessor:
-    def __init__(self, config, api_client):
+    def __init__(self, config, api_client, image_optimizer=None):
         self.config = config
         self.api_client = api_client
+        self.image_optimizer = image_optimizer
         self.uploaded_attachments = {}
+        self.pending_embeds = {}
         self.errors = []
 
+    def pop_embeds(self) -> Dict[str, DeferredDataUrl]:
+        embeds, self.pending_embeds = self.pending_embeds, {}
+        return embeds
+
     def is_attachment_uploaded(self, page_id: str, file_path: str) -> bool:
         return page_id in self.uploaded_attachments and file_path in self.uploaded_attachments[page_id]
     
-    def mark_attachment_uploaded(self, page_id: str, file_path: str, attachment_id: str):
+    def mark_attachment_uploaded(self, page_id: str, file_path: str, attachment_id: str, filename: str):
         if page_id not in self.uploaded_attachments:
             self.uploaded_attachments[page_id] = {}
-        self.uploaded_attachments[page_id][file_path] = attachment_id
+        self.uploaded_attachments[page_id][file_path] = {"id": attachment_id, "name": filename}
 
     def upload_attachment(self, file_path: str, filename: str, page_id: str) -> Optional[str]:
         if self.is_attachment_uploaded(page_id, file_path):
             logger.debug(f"Attachment already uploaded: {filename}")
-            return self.uploaded_attachments[page_id][file_path]
+            return self.uploaded_attachments[page_id][file_path]["id"]
         
         if not os.path.exists(file_path):
             logger.warning(f"Attachment file not found: {file_path}")
@@ -40,7 +46,7 @@ class ContentProcessor:
             
             if success:
                 attachment_id = response_data.get("id")
-                self.mark_attachment_uploaded(page_id, file_path, attachment_id)
+                self.mark_attachment_uploaded(page_id, file_path, attachment_id, filename)
                 return attachment_id
             else:
                 logger.error(f"Failed to upload attachment {filename}: {response_data}")
@@ -73,8 +79,12 @@ class ContentProcessor:
         if element["src"].startswith(("data:", "http://", "https://")) or not page_id or not is_image_file(file_path):
             return    
         try:
-            image_data_url = image_to_data_url(file_path)
-            element["src"] = image_data_url
+            if self.image_optimizer:
+                file_path = self.image_optimizer.resolve(file_path)
+            # The data URL is only expanded when the page body is streamed
+            embed = DeferredDataUrl(file_path)
+            self.pending_embeds[embed.placeholder] = embed
+            element["src"] = embed.placeholder
         except Exception as e:
             logger.error(f"Error processing image attachment {file_path}: {e}")
             self.errors.append((file_path, str(e)))
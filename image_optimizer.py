@@ -0,0 +1,200 @@
+import hashlib
+import os
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Optional, Tuple
+from utils import logger, is_image_file
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+
+# Formats that are left untouched: vector, animated or icon content
+SKIPPED_EXTENSIONS = frozenset([".svg", ".gif", ".ico"])
+# Lossless sources that may be re-encoded as PNG or lossless WebP
+LOSSLESS_EXTENSIONS = frozenset([".png", ".bmp", ".tiff"])
+# Marker written to the cache when the original is already the best candidate
+KEEP_ORIGINAL_SUFFIX = ".orig"
+# Bumped whenever the encoding choices change, so stale cache entries are ignored
+CACHE_VERSION = 3
+
+
+def _cache_key(data: bytes, max_dimension: int, quality: int) -> str:
+    digest = hashlib.sha256(data)
+    digest.update(f"{CACHE_VERSION}:{max_dimension}:{quality}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _find_cached(cache_dir: str, key: str) -> Optional[str]:
+    for ext in (".png", ".jpg", ".webp", KEEP_ORIGINAL_SUFFIX):
+        candidate = os.path.join(cache_dir, key + ext)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _encode_candidates(image, ext: str, quality: int) -> Dict[str, bytes]:
+    candidates = {}
+    # Colour profiles (e.g. Display P3 screenshots) must survive the conversion
+    icc_profile = image.info.get("icc_profile")
+
+    def encode(fmt: str, target_ext: str, **options):
+        if icc_profile and image.mode == "CMYK" and fmt != "JPEG":
+            # A CMYK profile cannot describe the RGB data these formats would write
+            return
+        # A format that cannot encode this image mode must not discard the others
+        try:
+            buffer = BytesIO()
+            image.save(buffer, format=fmt, icc_profile=icc_profile, **options)
+            candidates[target_ext] = buffer.getvalue()
+        except Exception as e:
+            logger.debug(f"Could not encode image as {fmt}: {e}")
+
+    if ext in (".jpg", ".jpeg"):
+        encode("JPEG", ".jpg", quality=quality, optimize=True, progressive=True)
+    elif ext == ".webp":
+        # WebP sources may be lossy already, a lossless re-encode would only grow them
+        encode("WEBP", ".webp", quality=quality, method=6)
+    elif ext in LOSSLESS_EXTENSIONS:
+        # Screenshots carry text, lossless encodings keep it sharp
+        encode("PNG", ".png", optimize=True)
+        encode("WEBP", ".webp", lossless=True, method=6)
+    return candidates
+
+
+def optimize_image(file_path: str, cache_dir: str, max_dimension: int, quality: int) -> Tuple[str, str, int, int, str]:
+    """Optimizes a single image, returns (source, result path, original size, new size, status)"""
+    try:
+        with open(file_path, "rb") as file:
+            data = file.read()
+        original_size = len(data)
+        key = _cache_key(data, max_dimension, quality)
+
+        cached = _find_cached(cache_dir, key)
+        if cached:
+            if cached.endswith(KEEP_ORIGINAL_SUFFIX):
+                return file_path, file_path, original_size, original_size, "cached"
+            return file_path, cached, original_size, os.path.getsize(cached), "cached"
+
+        ext = os.path.splitext(file_path)[1].lower()
+        with Image.open(BytesIO(data)) as image:
+            image.load()
+            if getattr(image, "is_animated", False):
+                candidates = {}
+            else:
+                image = ImageOps.exif_transpose(image)
+                if max(image.size) > max_dimension:
+                    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+                if ext in (".jpg", ".jpeg") and image.mode not in ("RGB", "L", "CMYK"):
+                    image = image.convert("RGB")
+                candidates = _encode_candidates(image, ext, quality)
+
+        if candidates:
+            best_ext, best_data = min(candidates.items(), key=lambda candidate: len(candidate[1]))
+            if len(best_data) < original_size:
+                result_path = os.path.join(cache_dir, key + best_ext)
+                tmp_path = f"{result_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as file:
+                    file.write(best_data)
+                os.replace(tmp_path, result_path)
+                return file_path, result_path, original_size, len(best_data), "optimized"
+
+        open(os.path.join(cache_dir, key + KEEP_ORIGINAL_SUFFIX), "wb").close()
+        return file_path, file_path, original_size, original_size, "unchanged"
+
+    except Exception as e:
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        return file_path, file_path, size, size, f"error: {e}"
+
+
+class ImageOptimizer:
+    def __init__(self, config):
+        self.config = config
+        self.cache_dir = getattr(config, "IMAGE_CACHE_DIR", None) or ".image_cache"
+        self.max_dimension = int(getattr(config, "IMAGE_MAX_DIMENSION", None) or 1920)
+        self.quality = int(getattr(config, "IMAGE_QUALITY", None) or 85)
+        workers = getattr(config, "IMAGE_WORKERS", None)
+        self.workers = int(workers) if workers else None
+
+        self.optimized_paths = {}
+        self.stats = {
+            "optimized": 0,
+            "cached": 0,
+            "unchanged": 0,
+            "errors": 0,
+            "bytes_before": 0,
+            "bytes_after": 0,
+        }
+
+    def is_available(self) -> bool:
+        if Image is None:
+            logger.warning("Pillow is not installed, image optimization is disabled")
+            return False
+        return True
+
+    def collect_images(self, source_path: str):
+        for root, _, files in os.walk(source_path):
+            for filename in files:
+                file_path = os.path.join(root, filename)
+                ext = os.path.splitext(filename)[1].lower()
+                if is_image_file(file_path) and ext not in SKIPPED_EXTENSIONS:
+                    yield os.path.normpath(file_path)
+
+    def optimize_tree(self, source_path: str) -> Dict[str, str]:
+        """Optimizes every image of the export on a process pool and returns the source to result path mapping"""
+        if not self.is_available():
+            return self.optimized_paths
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        images = list(self.collect_images(source_path))
+        logger.info(f"Optimizing {len(images)} image(s) with max dimension {self.max_dimension}px")
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    executor.submit(optimize_image, path, self.cache_dir, self.max_dimension, self.quality): path
+                    for path in images
+                }
+                for future in as_completed(futures):
+                    self._collect_result(futures[future], future)
+        except Exception as e:
+            # Optimization is optional, images that were not processed keep their original path
+            logger.error(f"Image optimization interrupted, using original images: {e}")
+
+        return self.optimized_paths
+
+    def _collect_result(self, path: str, future):
+        try:
+            source, result, before, after, status = future.result()
+        except Exception as e:
+            # A crashed worker (e.g. out of memory) breaks the pool, not the migration
+            logger.warning(f"Could not optimize image {path}: {e}")
+            self.stats["errors"] += 1
+            return
+        self.stats["bytes_before"] += before
+        self.stats["bytes_after"] += after
+        if status.startswith("error"):
+            logger.warning(f"Could not optimize image {source}: {status}")
+            self.stats["errors"] += 1
+            return
+        self.stats[status] += 1
+        if result != source:
+            self.optimized_paths[source] = result
+
+    def resolve(self, file_path: str) -> str:
+        return self.optimized_paths.get(os.path.normpath(file_path), file_path)
+
+    def print_report(self):
+        saved = self.stats["bytes_before"] - self.stats["bytes_after"]
+        logger.info(
+            f"Images optimized: {self.stats['optimized']}, "
+            f"from cache: {self.stats['cached']}, "
+            f"unchanged: {self.stats['unchanged']}, "
+            f"failed: {self.stats['errors']}"
+        )
+        logger.info(
+            f"Image bytes saved: {saved} "
+            f"({self.stats['bytes_before']} -> {self.stats['bytes_after']})"
+        )
@@ -10,6 +10,8 @@ def main():
     if args.clear:
         migrator.clear()
         logger.info("Data cleared")
+    elif args.verify or args.repair:
+        migrator.verify(repair=args.repair)
     else:
         try:
             migrator.run()
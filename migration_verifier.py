@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional
+from utils import logger
+
+
+SOURCE_TAG_QUERY = "[Source=Confluence]"
+
+# Manifest kind -> (list endpoint, search result type)
+ENDPOINTS = {
+    "books": ("/books", "book"),
+    "chapters": ("/chapters", "chapter"),
+    "pages": ("/pages", "page"),
+    "attachments": ("/attachments", None),
+}
+
+
+def content_hash(html: Optional[str]) -> str:
+    return hashlib.sha256((html or "").encode("utf-8")).hexdigest()
+
+
+def load_manifest(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        logger.error(f"Run manifest not found: {path}")
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except Exception as e:
+        logger.error(f"Error reading run manifest {path}: {e}")
+        return None
+
+
+def save_manifest(path: str, manifest: Dict):
+    try:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=2)
+        logger.info(f"Run manifest written to {path}")
+    except Exception as e:
+        logger.error(f"Error writing run manifest {path}: {e}")
+
+
+def _parent_id(value) -> Optional[int]:
+    # BookStack reports a missing chapter as 0
+    return int(value) if value else None
+
+
+class MigrationVerifier:
+    def __init__(self, api_client, manifest: Dict):
+        self.api_client = api_client
+        self.expected = {
+            kind: {int(item_id): entry for item_id, entry in manifest.get(kind, {}).items()}
+            for kind in ENDPOINTS
+        }
+        self.remote = {kind: {} for kind in ENDPOINTS}
+        self.tagged = {kind: {} for kind in ENDPOINTS}
+
+        self.report = {
+            "missing": [],
+            "duplicated": [],
+            "misplaced": [],
+            "content_mismatch": [],
+        }
+        self.repairs = []
+
+    def queue_repair(self, action: str, kind: str, item_id: int, reason: str, data: Dict = None):
+        self.repairs.append({
+            "action": action,
+            "kind": kind,
+            "id": item_id,
+            "reason": reason,
+            "data": data or {},
+        })
+
+    def build_index(self) -> bool:
+        """Pulls the list endpoints and keeps the items tagged as migrated from Confluence"""
+        success, results = self.api_client.search_all(SOURCE_TAG_QUERY)
+        if not success:
+            return False
+        tagged_ids = defaultdict(set)
+        for result in results:
+            tagged_ids[result.get("type")].add(result.get("id"))
+
+        for kind, (endpoint, search_type) in ENDPOINTS.items():
+            success, items = self.api_client.list_all(endpoint)
+            if not success:
+                return False
+            self.remote[kind] = {item["id"]: item for item in items}
+            if search_type:
+                self.tagged[kind] = {
+                    item_id: item for item_id, item in self.remote[kind].items()
+                    if item_id in tagged_ids[search_type]
+                }
+
+        # Attachments carry no tags, keep those hanging off migrated pages
+        migrated_pages = set(self.tagged["pages"]) | set(self.expected["pages"])
+        self.tagged["attachments"] = {
+            item_id: item for item_id, item in self.remote["attachments"].items()
+            if item.get("uploaded_to") in migrated_pages
+        }
+        logger.info(
+            "Indexed "
+            + ", ".join(f"{len(self.tagged[kind])} {kind}" for kind in ENDPOINTS)
+            + " tagged as migrated from Confluence"
+        )
+        return True
+
+    def find_missing(self):
+        for kind, expected in self.expected.items():
+            for item_id, entry in expected.items():
+                if item_id in self.remote[kind]:
+                    continue
+                self.report["missing"].append((kind, item_id, entry.get("title")))
+                if kind == "pages":
+                    self.queue_repair("recreate", kind, item_id, "missing", entry)
+
+    def _placement_key(self, kind: str, item: Dict):
+        match kind:
+            case "books":
+                return (item.get("name"),)
+            case "chapters":
+                return (item.get("book_id"), item.get("name"))
+            case "pages":
+                return (item.get("book_id"), _parent_id(item.get("chapter_id")), item.get("name"))
+            case "attachments":
+                return (item.get("uploaded_to"), item.get("name"))
+
+    def find_duplicates(self):
+        for kind, tagged in self.tagged.items():
+            groups = defaultdict(list)
+            for item_id, item in tagged.items():
+                groups[self._placement_key(kind, item)].append(item_id)
+
+            for key, item_ids in groups.items():
+                if len(item_ids) < 2:
+                    continue
+                known = [item_id for item_id in item_ids if item_id in self.expected[kind]]
+                extras = [item_id for item_id in item_ids if item_id not in self.expected[kind]]
+                self.report["duplicated"].append((kind, key[-1], sorted(item_ids)))
+                # Without a known original we cannot tell which copy to keep
+                if known:
+                    for item_id in extras:
+                        self.queue_repair("delete", kind, item_id, f"duplicate of {known[0]}")
+
+    def _expected_parents(self, kind: str, entry: Dict) -> Dict:
+        match kind:
+            case "chapters":
+                return {"book_id": entry.get("book_id")}
+            case "pages":
+                return {"book_id": entry.get("book_id"), "chapter_id": _parent_id(entry.get("chapter_id"))}
+            case "attachments":
+                return {"uploaded_to": entry.get("page_id")}
+        return {}
+
+    def find_misplaced(self):
+        for kind, expected in self.expected.items():
+            for item_id, entry in expected.items():
+                item = self.remote[kind].get(item_id)
+                if not item:
+                    continue
+                parents = self._expected_parents(kind, entry)
+                actual = {
+                    field: _parent_id(item.get(field)) if field == "chapter_id" else item.get(field)
+                    for field in parents
+                }
+                if actual == parents:
+                    continue
+                self.report["misplaced"].append((kind, item_id, entry.get("title"), actual, parents))
+                if kind == "pages" and parents["chapter_id"]:
+                    # Moving into the chapter also moves the page into its book
+                    target = {"chapter_id": parents["chapter_id"]}
+                else:
+                    target = {field: value for field, value in parents.items() if value is not None}
+                self.queue_repair("move", kind, item_id, "misplaced", target)
+
+    def find_content_mismatches(self):
+        for item_id, entry in self.expected["pages"].items():
+            item = self.remote["pages"].get(item_id)
+            if not item or not entry.get("content_hash"):
+                continue
+            # Only fetch pages whose list metadata changed since the run
+            if item.get("updated_at") == entry.get("updated_at"):
+                continue
+            success, page = self.api_client.request("GET", f"/pages/{item_id}")
+            if not success:
+                logger.error(f"Failed to fetch page {item_id}: {page}")
+                continue
+            if content_hash(page.get("html")) != entry["content_hash"]:
+                self.report["content_mismatch"].append(("pages", item_id, entry.get("title")))
+                self.queue_repair("update_content", "pages", item_id, "content hash mismatch", entry)
+
+    def verify(self) -> Dict[str, List]:
+        if not self.build_index():
+            logger.error("Could not build the BookStack index, verification aborted")
+            return self.report
+        self.find_missing()
+        self.find_duplicates()
+        self.find_misplaced()
+        self.find_content_mismatches()
+        return self.report
+
+    def print_report(self):
+        for kind, item_id, title in self.report["missing"]:
+            logger.warning(f"Missing {kind[:-1]}: '{title}' (ID: {item_id})")
+        for kind, name, item_ids in self.report["duplicated"]:
+            logger.warning(f"Duplicated {kind[:-1]}: '{name}' (IDs: {item_ids})")
+        for kind, item_id, title, actual, expected in self.report["misplaced"]:
+            logger.warning(f"Misplaced {kind[:-1]}: '{title}' (ID: {item_id}) is in {actual}, expected {expected}")
+        for kind, item_id, title in self.report["content_mismatch"]:
+            logger.warning(f"Content mismatch for {kind[:-1]}: '{title}' (ID: {item_id})")
+
+        for category, entries in self.report.items():
+            logger.info(f"{category.replace('_', ' ').capitalize()}: {len(entries)}")
+        logger.info(f"Repairs queued: {len(self.repairs)}")
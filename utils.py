@@ -2,9 +2,11 @@ import base64
 import enum
 import logging
 import mimetypes
+import os
 import re
 import sys
-from typing import Optional, Tuple
+import uuid
+from typing import Iterator, Optional, Tuple
 
 class Logger:
 
@@ -70,45 +72,56 @@ class DepthLevel(enum.Enum):
     
 
 
-def file_to_b64(path: str) -> Optional[str]:
-    try:
-        with open(path, "rb") as file:
-            data = file.read()
-            file_b64 = base64.b64encode(data).decode('utf-8')
-            return file_b64
-    except Exception as e:
-        logger.error(f"Error converting file to base64: {e}")
-        return None
+# Multiple of 3 so that encoded chunks concatenate without padding
+B64_CHUNK_SIZE = 3 * 256 * 1024
+
+
+def b64_length(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+def iter_file_b64(path: str, chunk_size: int = B64_CHUNK_SIZE) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield base64.b64encode(chunk)
+
 
 def is_image_file(file_path: str) -> bool:
     image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg', '.ico', '.tiff'}
     return file_path.lower().endswith(tuple(image_extensions))
 
-def image_to_data_url(image_path: str) -> Optional[str]:
-    try:
-        if not is_image_file(image_path):
-            logger.warning(f"File is not an image: {image_path}")
-            return None
-        base64_data = file_to_b64(image_path)
-        if not base64_data:
-            return None
-        mime_type, _ = mimetypes.guess_type(image_path)
-        if not mime_type or not mime_type.startswith('image/'):
-            ext = image_path.lower().split('.')[-1]
-            mime_map = {
-                '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
-                '.png': 'image/png', '.gif': 'image/gif',
-                '.bmp': 'image/bmp', '.webp': 'image/webp',
-                '.svg': 'image/svg+xml', '.ico': 'image/x-icon',
-                '.tiff': 'image/tiff'
-            }
-            mime_type = mime_map.get(ext, 'image/png')
-        data_url = f"data:{mime_type};base64,{base64_data}"
-        return data_url
-        
-    except Exception as e:
-        logger.error(f"Error creating data URL for {image_path}: {e}")
-        return None
+def image_mime_type(image_path: str) -> str:
+    mime_type, _ = mimetypes.guess_type(image_path)
+    if not mime_type or not mime_type.startswith('image/'):
+        ext = os.path.splitext(image_path.lower())[1]
+        mime_map = {
+            '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
+            '.png': 'image/png', '.gif': 'image/gif',
+            '.bmp': 'image/bmp', '.webp': 'image/webp',
+            '.svg': 'image/svg+xml', '.ico': 'image/x-icon',
+            '.tiff': 'image/tiff'
+        }
+        mime_type = mime_map.get(ext, 'image/png')
+    return mime_type
+
+
+class DeferredDataUrl:
+    """Data URL of a file, kept as a placeholder until the request body is streamed"""
+
+    PLACEHOLDER_PATTERN = re.compile(r"deferred-embed:[0-9a-f]{32}")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.prefix = f"data:{image_mime_type(path)};base64,".encode("ascii")
+        self.placeholder = f"deferred-embed:{uuid.uuid4().hex}"
+
+    def __len__(self) -> int:
+        return len(self.prefix) + b64_length(self.size)
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        yield self.prefix
+        yield from iter_file_b64(self.path)
 
 
 def title_to_slug(title: str) -> str: